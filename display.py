@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import matplotlib.pyplot as plt
+from time import perf_counter
+
 import numpy as np
 import numpy.typing as npt
 from probe import Probe
@@ -18,12 +19,22 @@ class Display:
         self.__ylim: tuple[float, float] = y_lim
         self.__ylabel: str = y_label
         self.__xlist: npt.NDArray[np.float64] = np.arange(self.__xlim[1], dtype=float)
+        self.__last_draw: float = 0.0
+        self.__active: bool = False
 
     def activate(self, dx: float) -> bool:
         """activate.
 
         :rtype: bool
         """
+        # matplotlib is only loaded here, so headless runs (benchmarks,
+        # compute nodes without a GUI stack) never pay for it.
+        try:
+            import matplotlib.pyplot as plt
+        except ImportError:
+            return False
+        self.__plt = plt
+        self.__active = True
         plt.ion()
         self.__fig, self.__ax = plt.subplots()
         self.__ax.set_xlim(0, self.__xlim[1] * dx)
@@ -40,6 +51,8 @@ class Display:
         :type probes_position: list
         :rtype: bool
         """
+        if not self.__active:
+            return False
         for probe in probes:
             self.__ax.plot(probe.position * dx, 0, color="red", marker="x")
         return True
@@ -51,6 +64,8 @@ class Display:
         :type sources_position: int
         :rtype: bool
         """
+        if not self.__active:
+            return False
         for source in sources:
             self.__ax.plot(source.position * dx, [0], color="black", marker="o")
 
@@ -62,6 +77,8 @@ class Display:
         :param positions:
         :rtype: bool
         """
+        if not self.__active:
+            return False
         for position in positions:
             self.__ax.plot(
                 [position, position], self.__ylim, color="black", linestyle="--"
@@ -73,7 +90,9 @@ class Display:
 
         :rtype: bool
         """
-        plt.ioff()
+        if not self.__active:
+            return False
+        self.__plt.ioff()
         return True
 
     def update_data(self, data: npt.NDArray[np.float64], time: float) -> bool:
@@ -85,6 +104,12 @@ class Display:
         :type time: int
         :rtype: bool
         """
+        if not self.__active or not self.__plt.fignum_exists(self.__fig.number):
+            return False
+        now = perf_counter()
+        if now - self.__last_draw < 1 / 60:
+            return False
+        self.__last_draw = now
         self.__yline.set_ydata(data)
         self.__ax.set_title(str(time))
         self.__fig.canvas.draw()
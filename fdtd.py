@@ -3,67 +3,165 @@
 
 from typing import List, Any
 
-import matplotlib.pyplot as plt
 import numpy as np
 import numpy.typing as npt
+from numba import cuda, njit, prange
 
 from constants import W_0, c
 from display import Display
 from layer import Layer
 from probe import Probe
 from source import Source
-from boundary import PECLeft, PECRight, ABCFirstLeft, ABCFirstRight, ABCSecondLeft, ABCSecondRight
+from boundary import Boundary, PECLeft, PECRight, ABCBase
+
+# Cells per tile; 4096 float64 keep an E/H/coefficient block inside L1.
+TILE: int = 4096
+# Minimum timesteps advanced between display refreshes.
+T_STEPS: int = 8
+# Grid size from which the threaded kernel outruns the serial one.
+PARALLEL_THRESHOLD: int = 1 << 17
+# Threads per block for the CUDA kernels.
+CUDA_TPB: int = 256
+
+
+def _aligned(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    # Copy values into a contiguous array whose data pointer is 64-byte
+    # aligned, so the kernels' vector loads never straddle a cache line.
+    buf = np.empty(values.size + 64 // dtype.itemsize, dtype=dtype)
+    offset = -buf.ctypes.data % 64 // dtype.itemsize
+    out = buf[offset : offset + values.size]
+    out[:] = values
+    return out
+
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def _step(E, H, ceze, cezh_sc, chh, src_idx, src_dh, tile):
+    n = E.size
+    for b in range(0, n, tile):
+        h_end = min(b + tile, H.size)
+        for i in range(b, h_end):
+            H[i] += chh[i] * (E[i + 1] - E[i])
+        for k in range(src_idx.size):
+            if b <= src_idx[k] < h_end:
+                H[src_idx[k]] -= src_dh[k]
+        e_end = min(b + tile, n - 1)
+        for i in range(max(b, 1), e_end):
+            E[i] = ceze[i] * E[i] + cezh_sc[i] * (H[i] - H[i - 1])
+
+
+@njit(cache=True, fastmath=True, boundscheck=False, parallel=True)
+def _step_parallel(E, H, ceze, cezh_sc, chh, src_idx, src_dh, tile):
+    # Unlike _step, the H and E sweeps run as separate passes: fusing them
+    # per tile would race on the H value a tile's E update shares with its
+    # left neighbour. Within a pass every tile owns disjoint indices.
+    n_tiles = (E.size + tile - 1) // tile
+    for t in prange(n_tiles):
+        b = t * tile
+        h_end = min(b + tile, H.size)
+        for i in range(b, h_end):
+            H[i] += chh[i] * (E[i + 1] - E[i])
+    for k in range(src_idx.size):
+        H[src_idx[k]] -= src_dh[k]
+    for t in prange(n_tiles):
+        b = t * tile
+        e_end = min(b + tile, E.size - 1)
+        for i in range(max(b, 1), e_end):
+            E[i] = ceze[i] * E[i] + cezh_sc[i] * (H[i] - H[i - 1])
+
+
+@cuda.jit
+def _cuda_update_H(E, H, chh):
+    i = cuda.grid(1)
+    if i < H.size:
+        H[i] += chh[i] * (E[i + 1] - E[i])
+
+
+@cuda.jit
+def _cuda_update_E(E, H, ceze, cezh_sc):
+    i = cuda.grid(1)
+    if 1 <= i < E.size - 1:
+        E[i] = ceze[i] * E[i] + cezh_sc[i] * (H[i] - H[i - 1])
+
+
+@cuda.jit
+def _cuda_inject(F, idx, tab, q, sign):
+    k = cuda.grid(1)
+    if k < idx.size:
+        cuda.atomic.add(F, idx[k], sign * tab[q, k])
+
+
+@cuda.jit
+def _cuda_gather(out, F, idx, q):
+    k = cuda.grid(1)
+    if k < idx.size:
+        out[q, k] = F[idx[k]]
+
 
 class FDTD:
     def __init__(
-        self, area_size: float, space_step: float, time_duration: float, Sc: float
+        self,
+        area_size: float,
+        space_step: float,
+        time_duration: float,
+        Sc: float,
+        steps_per_frame: int | None = None,
+        dtype: npt.DTypeLike = np.float32,
+        backend: str = "cpu",
     ) -> None:
+        self.__backend: str = backend
         self.__dx: float = space_step
         self.__Sc: float = Sc
         self.__area_size: int = int(area_size // self.__dx)
         self.__time_duration: float = time_duration
         self.__dt: float = self.__dx * self.__Sc / c
         self.__time_counts: int = int(self.__time_duration // self.__dt)
-        self.__E: npt.NDArray[np.float64] = np.zeros(self.__area_size)
-        self.__H: npt.NDArray[np.float64] = np.zeros(self.__area_size - 1)
-        self.__eps: npt.NDArray[np.float64] = np.ones(self.__area_size)
-        self.__sigma: npt.NDArray[np.float64] = np.zeros(self.__area_size)
-        self.__mu: npt.NDArray[np.float64] = np.ones(self.__area_size - 1)
+        self.__steps_per_frame: int = (
+            steps_per_frame
+            if steps_per_frame is not None
+            else max(T_STEPS, self.__time_counts // 1000)
+        )
+        self.__dtype: np.dtype = np.dtype(dtype)
+        self.__E: npt.NDArray = np.zeros(self.__area_size, dtype=self.__dtype)
+        self.__H: npt.NDArray = np.zeros(self.__area_size - 1, dtype=self.__dtype)
+        self.__eps: npt.NDArray = np.ones(self.__area_size, dtype=self.__dtype)
+        self.__sigma: npt.NDArray = np.zeros(self.__area_size, dtype=self.__dtype)
+        self.__mu: npt.NDArray = np.ones(self.__area_size - 1, dtype=self.__dtype)
+        self.__ceze: npt.NDArray = _aligned(np.empty(self.__area_size), self.__dtype)
+        self.__cezh_sc: npt.NDArray = _aligned(
+            np.empty(self.__area_size), self.__dtype
+        )
+        self.__chh: npt.NDArray = _aligned(np.empty(self.__area_size - 1), self.__dtype)
+        self.__update_coefficients(0, self.__area_size)
         self.__borders: list[float] = []
-        self.__boundary: npt.NDArray[Boundary] = np.array([PECLeft(), PECRight()])
+        self.__boundary: list[Boundary] = [PECLeft(), PECRight()]
         self.__display: Display = Display((0, self.__area_size), (-1.1, 1.1), "Ez В/м")
         self.__display.activate(self.__dx)
         self.__sources: list[Source] = []
         self.__probes: list[Probe] = []
         self.__layers: list[Layer] = []
 
+    def __update_coefficients(self, begin: int, end: int) -> None:
+        # The coefficients are elementwise in the material arrays, so a
+        # layer change only needs to refresh its own cell range.
+        sigma = self.__sigma[begin:end]
+        self.__ceze[begin:end] = (1 - sigma) / (1 + sigma)
+        self.__cezh_sc[begin:end] = (
+            self.__Sc * W_0 / (self.__eps[begin:end] * (1 + sigma))
+        )
+        self.__chh[begin:end] = self.__Sc / (W_0 * self.__mu[begin:end])
+
     def update_boundary(self) -> bool:
-        for boundary in self.__boundary:
-            match boundary:
-                case ABCFirstLeft():
-                    boundary.eps = self.__eps[0]
-                    boundary.mu = self.__mu[0]
-                    boundary.Sc = self.__Sc
-                    boundary.update_coefficient()
-                case ABCFirstRight():
-                    boundary.eps = self.__eps[-1]
-                    boundary.mu = self.__mu[-1]
-                    boundary.Sc = self.__Sc
-                    boundary.update_coefficient()
-                case ABCSecondLeft():
-                    boundary.eps = self.__eps[0]
-                    boundary.mu = self.__mu[0]
-                    boundary.Sc = self.__Sc
-                    boundary.update_coefficient()
-                case ABCSecondRight():
-                    boundary.eps = self.__eps[-1]
-                    boundary.mu = self.__mu[-1]
-                    boundary.Sc = self.__Sc
-                    boundary.update_coefficient()
-                case _, arg:
-                    print(f"Boundary undefined; Type is {type(arg)}")
-        for boundary in self.__boundary:
-            print(type(boundary))
+        boundary_left, boundary_right = self.__boundary
+        if isinstance(boundary_left, ABCBase):
+            boundary_left.eps = self.__eps[0]
+            boundary_left.mu = self.__mu[0]
+            boundary_left.Sc = self.__Sc
+            boundary_left.update_coefficient()
+        if isinstance(boundary_right, ABCBase):
+            boundary_right.eps = self.__eps[-1]
+            boundary_right.mu = self.__mu[-1]
+            boundary_right.Sc = self.__Sc
+            boundary_right.update_coefficient()
         return True
 
     def analyze(self) -> bool:
@@ -72,43 +170,149 @@ class FDTD:
         self.__display.draw_borders(self.__borders)
         self.__display.draw_sources(self.__sources, self.__dx)
 
-        ceze = (1 - self.__sigma) / (1 + self.__sigma)
-        cezh = W_0 / (self.__eps * (1 + self.__sigma))
+        src_idx = np.array(
+            [source.position - 1 for source in self.__sources], dtype=np.int64
+        )
+        src_ch = self.__chh[src_idx]
+        src_ce = np.array(
+            [
+                self.__Sc
+                / (self.__eps[source.position] * self.__mu[source.position]) ** 0.5
+                for source in self.__sources
+            ],
+            dtype=self.__dtype,
+        )
+        src_pos = np.array(
+            [source.position for source in self.__sources], dtype=np.int64
+        )
+        # source.E is a pure function of its arguments, so the whole waveform
+        # (with the injection coefficient folded in) is tabulated up front.
+        src_dh_tab = np.empty((self.__time_counts, len(self.__sources)), self.__dtype)
+        src_de_tab = np.empty_like(src_dh_tab)
+        for k, source in enumerate(self.__sources):
+            for q in range(self.__time_counts):
+                src_dh_tab[q, k] = src_ch[k] * source.E(0, q)
+                src_de_tab[q, k] = src_ce[k] * source.E(-0.5, (q + 0.5))
+        boundary_left, boundary_right = self.__boundary
+        step = _step_parallel if self.__area_size >= PARALLEL_THRESHOLD else _step
+        # The first call JIT-compiles the kernel (or loads it from the
+        # on-disk cache); run it on a dummy grid so the cost is paid before
+        # the first frame instead of inside it.
+        step(
+            np.zeros(2, self.__dtype),
+            np.zeros(1, self.__dtype),
+            np.ones(2, self.__dtype),
+            np.ones(2, self.__dtype),
+            np.ones(1, self.__dtype),
+            np.zeros(0, np.int64),
+            np.zeros(0, self.__dtype),
+            TILE,
+        )
+        probe_idx = np.array([probe.position for probe in self.__probes], dtype=np.intp)
+        probe_E = np.empty((self.__time_counts, probe_idx.size), dtype=self.__dtype)
+        probe_H = np.empty((self.__time_counts, probe_idx.size), dtype=self.__dtype)
 
-        for q in range(self.__time_counts):
-            self.__H = self.__H + (self.__E[1:] - self.__E[:-1]) * self.__Sc / (
-                W_0 * self.__mu
+        if self.__backend == "cuda" and cuda.is_available():
+            self.__time_loop_cuda(
+                src_idx, src_pos, src_dh_tab, src_de_tab, probe_idx, probe_E, probe_H
             )
-            for source in self.__sources:
-                self.__H[source.position - 1] -= (
-                    self.__Sc / (W_0 * self.__mu[source.position - 1]) * source.E(0, q)
-                )
-
-            self.__E[1:-1] = (
-                ceze[1:-1] * self.__E[1:-1]
-                + (self.__H[1:] - self.__H[:-1]) * self.__Sc * cezh[1:-1]
-            )
-            
-            for boundary in self.__boundary:
-                if boundary:
-                    boundary.update_field(self.__E, self.__H)
-
-            for source in self.__sources:
-                self.__E[source.position] += (
-                    self.__Sc
-                    / (self.__eps[source.position] * self.__mu[source.position]) ** 0.5
-                    * source.E(-0.5, (q + 0.5))
-                )
-
-            for probe in self.__probes:
-                probe.add_data(self.__E, self.__H)
-
-            if not q % 3:
-                self.__display.update_data(self.__E, q * self.__dt)
+        else:
+            for q_0 in range(0, self.__time_counts, self.__steps_per_frame):
+                q_1 = min(q_0 + self.__steps_per_frame, self.__time_counts)
+                for q in range(q_0, q_1):
+                    step(
+                        self.__E,
+                        self.__H,
+                        self.__ceze,
+                        self.__cezh_sc,
+                        self.__chh,
+                        src_idx,
+                        src_dh_tab[q],
+                        TILE,
+                    )
+
+                    boundary_left.update_field(self.__E, self.__H)
+                    boundary_right.update_field(self.__E, self.__H)
+
+                    np.add.at(self.__E, src_pos, src_de_tab[q])
+
+                    np.take(self.__E, probe_idx, out=probe_E[q])
+                    np.take(self.__H, probe_idx, out=probe_H[q])
+
+                self.__display.update_data(self.__E, (q_1 - 1) * self.__dt)
                 self.__display.stop()
+
+        for k, probe in enumerate(self.__probes):
+            probe.load_data(
+                np.ascontiguousarray(probe_E[:, k]), np.ascontiguousarray(probe_H[:, k])
+            )
         return True
 
+    def __time_loop_cuda(
+        self, src_idx, src_pos, src_dh_tab, src_de_tab, probe_idx, probe_E, probe_H
+    ) -> None:
+        # The fields and tables live on the device for the whole run; only
+        # the grid edges cross the bus each step (for the Python boundary
+        # objects) plus one full E copy per displayed frame.
+        boundary_left, boundary_right = self.__boundary
+        blocks = (self.__area_size + CUDA_TPB - 1) // CUDA_TPB
+        d_E = cuda.to_device(self.__E)
+        d_H = cuda.to_device(self.__H)
+        d_ceze = cuda.to_device(self.__ceze)
+        d_cezh_sc = cuda.to_device(self.__cezh_sc)
+        d_chh = cuda.to_device(self.__chh)
+        d_src_idx = cuda.to_device(src_idx)
+        d_src_pos = cuda.to_device(src_pos)
+        d_dh_tab = cuda.to_device(src_dh_tab)
+        d_de_tab = cuda.to_device(src_de_tab)
+        d_probe_idx = cuda.to_device(probe_idx)
+        d_probe_E = cuda.device_array(probe_E.shape, self.__dtype)
+        d_probe_H = cuda.device_array(probe_H.shape, self.__dtype)
+        # The boundary classes only touch the three outermost cells on each
+        # side, so a six-cell E scratch (and four-cell H scratch) behaves
+        # like the full array for both ends at once.
+        e_edge = np.empty(6, self.__dtype)
+        h_edge = np.empty(4, self.__dtype)
+        n = self.__area_size
+
+        for q_0 in range(0, self.__time_counts, self.__steps_per_frame):
+            q_1 = min(q_0 + self.__steps_per_frame, self.__time_counts)
+            for q in range(q_0, q_1):
+                _cuda_update_H[blocks, CUDA_TPB](d_E, d_H, d_chh)
+                if src_idx.size:
+                    _cuda_inject[1, src_idx.size](d_H, d_src_idx, d_dh_tab, q, -1.0)
+                _cuda_update_E[blocks, CUDA_TPB](d_E, d_H, d_ceze, d_cezh_sc)
+
+                d_E[:3].copy_to_host(e_edge[:3])
+                d_E[n - 3 :].copy_to_host(e_edge[3:])
+                d_H[:2].copy_to_host(h_edge[:2])
+                d_H[n - 3 :].copy_to_host(h_edge[2:])
+                boundary_left.update_field(e_edge, h_edge)
+                boundary_right.update_field(e_edge, h_edge)
+                d_E[:3].copy_to_device(e_edge[:3])
+                d_E[n - 3 :].copy_to_device(e_edge[3:])
+                d_H[:2].copy_to_device(h_edge[:2])
+                d_H[n - 3 :].copy_to_device(h_edge[2:])
+
+                if src_pos.size:
+                    _cuda_inject[1, src_pos.size](d_E, d_src_pos, d_de_tab, q, 1.0)
+                if probe_idx.size:
+                    _cuda_gather[1, probe_idx.size](d_probe_E, d_E, d_probe_idx, q)
+                    _cuda_gather[1, probe_idx.size](d_probe_H, d_H, d_probe_idx, q)
+
+            d_E.copy_to_host(self.__E)
+            self.__display.update_data(self.__E, (q_1 - 1) * self.__dt)
+            self.__display.stop()
+
+        d_E.copy_to_host(self.__E)
+        d_H.copy_to_host(self.__H)
+        if probe_idx.size:
+            d_probe_E.copy_to_host(probe_E)
+            d_probe_H.copy_to_host(probe_H)
+
     def show_probe_signals(self) -> bool:
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
 
         ax.set_xlim(0, self.__dt * self.__time_counts)
@@ -128,15 +332,12 @@ class FDTD:
         return True
 
     def add_probes(self, probes_position: float | list[float]) -> bool:
-        if type(probes_position) == float:
+        if isinstance(probes_position, (int, float)):
+            probes_position = [probes_position]
+        for probe_position in probes_position:
             self.__probes.append(
-                Probe(int(probes_position // self.__dx), self.__time_counts)
+                Probe(int(probe_position // self.__dx), self.__time_counts)
             )
-        elif type(probes_position) == list:
-            for probe_position in probes_position:
-                self.__probes.append(
-                    Probe(int(probe_position // self.__dx), self.__time_counts)
-                )
         return True
 
     def add_source(self, sources: Any) -> bool:
@@ -163,9 +364,11 @@ class FDTD:
         layer.name = "Layer" + str(len(self.__layers))
         self.__layers.append(layer)
         begin, end = int(layer.area[0] / self.__dx), int(layer.area[1] / self.__dx)
+        layer.bounds = (begin, end)
         self.__eps[begin:end] = layer.eps
         self.__mu[begin:end] = layer.mu
         self.__sigma[begin:end] = layer.sigma
+        self.__update_coefficients(begin, end)
         self.__borders.append(layer.area[0])
         self.__borders.append(layer.area[1])
         return True
@@ -173,12 +376,11 @@ class FDTD:
     def delete_layer(self, name: str) -> bool:
         for i, layer in enumerate(self.__layers):
             if layer.name == name:
-                begin, end = int(layer.area[0] / self.__dx), int(
-                    layer.area[1] / self.__dx
-                )
+                begin, end = layer.bounds
                 self.__eps[begin:end] = 1
                 self.__mu[begin:end] = 1
                 self.__sigma[begin:end] = 0
+                self.__update_coefficients(begin, end)
                 self.__borders.pop(2 * i + 1)
                 self.__borders.pop(2 * i)
                 self.__layers.pop(i)
@@ -193,6 +395,10 @@ class FDTD:
         self.__boundary[1] = boundary
         return True
 
+    @property
+    def steps_per_frame(self) -> int:
+        return self.__steps_per_frame
+
     @property
     def Sc(self) -> float:
         return self.__Sc
@@ -213,4 +419,8 @@ class FDTD:
     def eps(self) -> np.ndarray:
         return self.__eps
 
+    @property
+    def dtype(self) -> np.dtype:
+        return self.__dtype
+
 
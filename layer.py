@@ -15,6 +15,7 @@ class Layer:
         self.__sigma: float = sigma
         self.__area: tuple[float, float] = area
         self.__name: str = ""
+        self.__bounds: tuple[int, int] = (0, 0)
 
     @property
     def eps(self) -> float:
@@ -52,6 +53,15 @@ class Layer:
         self.__area = value
         return True
 
+    @property
+    def bounds(self) -> tuple[int, int]:
+        return self.__bounds
+
+    @bounds.setter
+    def bounds(self, value: tuple[int, int]) -> bool:
+        self.__bounds = value
+        return True
+
     @property
     def name(self) -> str:
         return self.__name
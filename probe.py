@@ -17,6 +17,12 @@ class Probe:
         self.__time += 1
         return True
 
+    def load_data(self, E: np.ndarray, H: np.ndarray) -> bool:
+        self.__E = E
+        self.__H = H
+        self.__time = E.size
+        return True
+
     @property
     def E(self) -> np.ndarray:
         return self.__E